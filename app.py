@@ -1,19 +1,52 @@
 import os
 import re
 import tempfile
-from flask import Flask, request, render_template_string, redirect, flash
-import joblib
-import pandas as pd
-import numpy as np
+import threading
+import time
+from flask import Flask, request, render_template_string, redirect, flash, jsonify
 import subprocess
+from dynamic_features import DynamicFeatureExtractor
+from compiler_flags import decode_flag_code
+from flag_ranking import DEFAULT_TOP_K, rank_flag_combinations, verify_top_k
+
+# pandas, numpy, joblib and sklearn are imported on first use so a worker can
+# bind and answer /ready before paying for them
+
+
+def _process_start():
+    """
+    perf_counter() value at which this process started, from the kernel's
+    record in /proc/self/stat, so startup figures include interpreter and
+    import time. Falls back to now where /proc is unavailable.
+    """
+    now = time.perf_counter()
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Field 22 (starttime) follows the parenthesised command name
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return now
+    return now - max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+
+
+_PROCESS_START = _process_start()
 
 # --- Feature extraction and prediction logic ---
 class PredictFeatureExtractor:
-    def __init__(self):
+    def __init__(self, dynamic=None):
         self.features_list = [
             "add", "mul", "load", "store", "call",
             "define", "br i1", "loops", "basic_blocks", "total_instructions"
         ]
+        # Optional DynamicFeatureExtractor; must match what the model was trained on
+        self.dynamic = dynamic
+
+    def columns(self):
+        if self.dynamic is None:
+            return list(self.features_list)
+        return self.features_list + self.dynamic.feature_names
 
     def _count_in_ir(self, ir_filename, pattern):
         cnt = 0
@@ -64,6 +97,8 @@ class PredictFeatureExtractor:
                     feature_dict[feature] = self.count_instruction_c_source(c_file_path, "loops")
                 else:
                     feature_dict[feature] = self.count_instruction(temp_ir_file, feature)
+            if self.dynamic is not None:
+                feature_dict.update(self.dynamic.extract_features(c_file_path))
         except subprocess.CalledProcessError:
             return {}
         finally:
@@ -73,21 +108,14 @@ class PredictFeatureExtractor:
 
 
 def predict_optimization_flags(c_file_path, model, feature_extractor):
-    features = feature_extractor.extract_features(c_file_path)
-    if not features:
+    # Top-1 of rank_flag_combinations, split into (opt level, frame-pointer, unroll)
+    ranked = rank_flag_combinations(c_file_path, model, feature_extractor, k=1)
+    if not ranked:
         return None, None, None
-    cols = [
-        "add", "mul", "load", "store", "call",
-        "define", "br i1", "loops", "basic_blocks", "total_instructions"
-    ]
-    df = pd.DataFrame([[features.get(c, 0) for c in cols]], columns=cols)
-    preds = model.predict(df)
-    row = preds.flatten()
-    opt_idx = int(np.argmax(row[:5]))
-    opt_map = {0: "O0", 1: "O1", 2: "O2", 3: "O3", 4: "Os"}
-    opt_flag = opt_map.get(opt_idx, "O0")
-    f_flag = "fomit-frame-pointer" if row[5] >= 0.5 else None
-    u_flag = "funroll-loops" if row[6] >= 0.5 else None
+    flags = decode_flag_code(ranked[0][0])
+    opt_flag = [f for f in flags if f.startswith("-O")][-1][1:]
+    f_flag = "fomit-frame-pointer" if "-fomit-frame-pointer" in flags else None
+    u_flag = "funroll-loops" if "-funroll-loops" in flags else None
     return opt_flag, f_flag, u_flag
 
 # --- Flask App ---
@@ -96,11 +124,115 @@ app.secret_key = os.urandom(24)
 
 # Load model
 MODEL_PATH = 'random_forest_optimization_model.joblib'
-try:
-    model = joblib.load(MODEL_PATH)
-except Exception as e:
-    raise RuntimeError(f"Failed to load model: {e}")
-extractor = PredictFeatureExtractor()
+_model = None
+_model_error = None
+_model_lock = threading.Lock()
+_startup_stats = {}
+
+
+# OPTIML_PRELOAD_MODEL=1 loads the model while the module is imported. Run
+# gunicorn with --preload so that happens once in the master: forked workers
+# then share the tree arrays copy-on-write instead of each holding a copy.
+# OPTIML_LAZY_MODEL=1 defers loading until the first prediction or /ready probe.
+PRELOAD_MODEL = os.environ.get("OPTIML_PRELOAD_MODEL", "0") not in ("", "0")
+LAZY_MODEL = os.environ.get("OPTIML_LAZY_MODEL", "0") not in ("", "0")
+_warm_thread = None
+
+
+def _before_fork():
+    # Forking mid-load would leave the child holding import and model locks
+    # owned by a thread that no longer exists; finish the load first so the
+    # children inherit the warm model instead
+    if _warm_thread is not None and _warm_thread.is_alive():
+        _warm_thread.join()
+
+
+def _after_fork_in_child():
+    # The warm-up thread does not survive the fork, so start a fresh one;
+    # startup figures count from the fork, when this worker began
+    global _model_lock, _warm_thread, _PROCESS_START
+    _PROCESS_START = time.perf_counter()
+    _model_lock = threading.Lock()
+    _warm_thread = None
+    if _model is None and not LAZY_MODEL:
+        _start_warmup()
+
+
+os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
+
+
+def _memory_stats():
+    """Resident memory of this worker in kB, split into private and file-backed pages."""
+    stats = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem'):
+                    stats[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return stats
+
+
+def get_model():
+    """
+    Returns the forest, loading it on first use.
+
+    Unpickling copies every tree into memory owned by the estimator, so
+    workers only share the forest when it was loaded before they were
+    forked (OPTIML_PRELOAD_MODEL=1 with gunicorn --preload).
+    """
+    global _model, _model_error
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            load_start = time.perf_counter()
+            try:
+                import joblib
+                _model = joblib.load(MODEL_PATH)
+            except Exception as e:
+                _model_error = f"Failed to load model: {e}"
+                raise RuntimeError(_model_error)
+            _startup_stats.update(
+                pid=os.getpid(),
+                model_load_seconds=round(time.perf_counter() - load_start, 3),
+                ready_after_seconds=round(time.perf_counter() - _PROCESS_START, 3),
+                **_memory_stats()
+            )
+            app.logger.info(f"Model warm: {_startup_stats}")
+    return _model
+
+
+def _warm_model():
+    try:
+        get_model()
+    except RuntimeError:
+        pass
+
+
+def _start_warmup():
+    """Loads the model on a background thread unless it is loaded or loading."""
+    global _warm_thread
+    if _model is not None or (_warm_thread is not None and _warm_thread.is_alive()):
+        return
+    _warm_thread = threading.Thread(target=_warm_model, daemon=True)
+    _warm_thread.start()
+
+
+if PRELOAD_MODEL:
+    _warm_model()
+    # Keep the collector from touching, and so un-sharing, the preloaded objects
+    import gc
+    gc.freeze()
+elif not LAZY_MODEL:
+    _start_warmup()
+# Dynamic features execute the submitted program, so they are opt-in
+extractor = PredictFeatureExtractor(dynamic=DynamicFeatureExtractor.from_env())
+# Verifying builds and runs the submitted program on this host, so it is opt-in too
+ALLOW_VERIFY = os.environ.get("OPTIML_ALLOW_VERIFY", "0") not in ("", "0")
+TOP_K = int(os.environ.get("OPTIML_TOP_K", str(DEFAULT_TOP_K)))
 
 # HTML template with Bootstrap, Animate.css, spinner, editor & file upload
 TEMPLATE = '''
@@ -139,6 +271,12 @@ TEMPLATE = '''
         <label for="cfile" class="form-label">Or upload a C source file:</label>
         <input class="form-control" type="file" id="cfile" name="cfile" accept=".c">
       </div>
+      {% if allow_verify %}
+      <div class="form-check mb-3">
+        <input class="form-check-input" type="checkbox" id="verify" name="verify" value="1">
+        <label class="form-check-label" for="verify">Verify by benchmarking the top {{ top_k }} candidates</label>
+      </div>
+      {% endif %}
       <button type="submit" class="btn btn-primary btn-animate animate__animated animate__heartBeat">Predict</button>
       <div id="spinner" class="spinner-border text-primary ms-3 animate__animated animate__rotateIn" role="status">
         <span class="visually-hidden">Loading...</span>
@@ -148,13 +286,15 @@ TEMPLATE = '''
       <div class="card mt-4 animate__animated animate__fadeInRight">
         <div class="card-body">
           <h5 class="card-title">Prediction for {{ filename }}:</h5>
-          <ul>
-            <li><strong>-{{ result.opt_flag }}</strong></li>
-            {% if result.f_flag %}<li><strong>-{{ result.f_flag }}</strong></li>{% endif %}
-            {% if result.u_flag %}<li><strong>-{{ result.u_flag }}</strong></li>{% endif %}
-          </ul>
+          <ol>
+            {% for cand in result.ranked %}
+              <li><strong>{{ cand.flags }}</strong> &mdash; {{ '%.0f' % (cand.prob * 100) }}%
+                {% if cand.time is not none %}<span class="text-muted">({{ '%.4f' % cand.time }} s)</span>{% endif %}</li>
+            {% endfor %}
+          </ol>
+          {% if result.verified %}<p class="text-success">Fastest of the benchmarked candidates.</p>{% endif %}
           <p>Compile with:</p>
-          <code>clang -{{ result.opt_flag }} {% if result.f_flag %}-{{ result.f_flag }} {% endif %}{% if result.u_flag %}-{{ result.u_flag }} {% endif %}{{ filename }} -o {{ filename[:-2] }}</code>
+          <code>clang {{ result.flags }} {{ filename }} -o {{ filename[:-2] }}</code>
         </div>
       </div>
     {% endif %}
@@ -177,7 +317,7 @@ def upload_and_predict():
         uploaded = request.files.get('cfile')
         if not code_text and (not uploaded or uploaded.filename == ''):
             flash('Please paste code or upload a .c file')
-            return render_template_string(TEMPLATE, result=None)
+            return render_template_string(TEMPLATE, result=None, allow_verify=ALLOW_VERIFY, top_k=TOP_K)
         tmp = tempfile.NamedTemporaryFile(suffix='.c', delete=False)
         filename = uploaded.filename if uploaded and uploaded.filename.endswith('.c') else 'pasted_code.c'
         if code_text:
@@ -185,18 +325,43 @@ def upload_and_predict():
         else:
             uploaded.save(tmp.name)
         tmp.close()
+        verify = ALLOW_VERIFY and request.form.get('verify') == '1'
         try:
-            opt, fopt, uopt = predict_optimization_flags(tmp.name, model, extractor)
+            ranked = rank_flag_combinations(tmp.name, get_model(), extractor, k=TOP_K)
+            best, timings = verify_top_k(tmp.name, ranked) if verify and ranked else (None, {})
         except Exception:
             flash('Error during feature extraction or prediction')
             os.remove(tmp.name)
-            return render_template_string(TEMPLATE, result=None)
+            return render_template_string(TEMPLATE, result=None, allow_verify=ALLOW_VERIFY, top_k=TOP_K)
         os.remove(tmp.name)
-        if not opt:
+        if not ranked:
             flash('Could not extract features. Please check your C code.')
         else:
-            result = {'opt_flag': opt, 'f_flag': fopt, 'u_flag': uopt}
-    return render_template_string(TEMPLATE, result=result, filename=filename)
+            choice = best or ranked[0][0]
+            result = {
+                'ranked': [{'flags': ' '.join(decode_flag_code(code)), 'prob': prob,
+                            'time': timings.get(code)} for code, prob in ranked],
+                'flags': ' '.join(decode_flag_code(choice)),
+                'verified': best is not None,
+            }
+    return render_template_string(TEMPLATE, result=result, filename=filename,
+                                  allow_verify=ALLOW_VERIFY, top_k=TOP_K)
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness probe: 200 once the model is warm, 503 while loading or if it
+    failed. A probe on a cold worker starts the load, so lazy workers behind
+    a readiness gate still become ready.
+    """
+    if _model is None:
+        _start_warmup()
+        body = {'ready': False, 'pid': os.getpid(),
+                'uptime_seconds': round(time.perf_counter() - _PROCESS_START, 3)}
+        if _model_error:
+            body['error'] = _model_error
+        return jsonify(body), 503
+    return jsonify(dict(_startup_stats, ready=True, current=_memory_stats()))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -1,18 +1,44 @@
+import os
 import subprocess
+import threading
 import time
+from workload import WorkloadManifest, WorkloadRunner
+from toolchain import CC
 
-def compile_and_run(source_file, flags):
-    output_bin = 'a.out'
-    compile_cmd = ["gcc", source_file, "-o", output_bin] + flags
+_workload_runner = WorkloadRunner()
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_workload(source_file):
+    # Parsed once per program; a broken manifest is remembered as an error
+    with _manifests_lock:
+        if source_file not in _manifests:
+            try:
+                _manifests[source_file] = WorkloadManifest.for_source(source_file)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[!] Invalid workload manifest for {source_file}: {e}")
+                _manifests[source_file] = e
+        return _manifests[source_file]
+
+def compile_and_run(source_file, flags, output_bin='a.out', compiler=None, workload_source=None):
+    # workload_source: program whose manifest applies when source_file is a generated variant
+    compile_cmd = [compiler or CC, source_file, "-o", output_bin] + flags
 
     try:
         subprocess.run(compile_cmd, check=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
     except subprocess.CalledProcessError:
         return float('inf')
 
+    # Programs with a workload manifest are scored by projected production cost
+    manifest = get_workload(workload_source or source_file)
+    if isinstance(manifest, Exception):
+        return float('inf')
+    if manifest is not None:
+        return _workload_runner.projected_cost(output_bin, manifest)
+
     start = time.perf_counter()
     try:
-        subprocess.run(["./" + output_bin], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.run([os.path.abspath(output_bin)], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     except subprocess.CalledProcessError:
         return float('inf')
     end = time.perf_counter()
@@ -3,8 +3,22 @@ all_flags = [
     "-O1", "-O2", "-O3", "-Os"
 ]
 
+# Flag codes used as dataset labels: an -O level optionally followed by a binary flag
+opt_level_map = {'0': '-O0', '1': '-O1', '2': '-O2', '3': '-O3', 's': '-Os'}
+binary_flags = {'f': '-fomit-frame-pointer', 'u': '-funroll-loops'}
+
 def generate_random_flags():
     return [random.randint(0, 1) for _ in all_flags]
 
 def apply_flags(bit_vector):
     return [flag for flag, bit in zip(all_flags, bit_vector) if bit]
+
+def all_flag_codes():
+    return list(opt_level_map) + [o + b for o in opt_level_map for b in binary_flags]
+
+def decode_flag_code(code):
+    # Older datasets also pair two -O levels (e.g. "2s"); the last one wins on the command line
+    flags = [opt_level_map[code[0]]]
+    for extra in code[1:]:
+        flags.append(binary_flags.get(extra) or opt_level_map[extra])
+    return flags
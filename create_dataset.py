@@ -1,10 +1,20 @@
 from dataset_gen import DatasetGenerator
+from dynamic_features import DynamicFeatureExtractor
+from dedup import DedupIndex
+from suite_tuning import LABEL_STORE, MeasurementStore
+from toolchain import CC, toolchain_id
 import os
 
-generator = DatasetGenerator()
+# Set OPTIML_DYNAMIC_FEATURES=1 to append runtime features to every row
+# Per-flag timings are kept so model_selection.py can score predictions by slowdown
+generator = DatasetGenerator(dynamic=DynamicFeatureExtractor.from_env(), measurements=MeasurementStore(LABEL_STORE))
 folder_path = "./c_programs"
 processed_file_list = "processed_files.txt"
 
+# Renamed or lightly edited copies reuse the label of the program they duplicate
+dedup_index = DedupIndex("dedup_index.jsonl")
+current_toolchain = toolchain_id(CC)
+
 # Load already processed files
 if os.path.exists(processed_file_list):
     with open(processed_file_list, 'r') as f:
@@ -17,7 +27,17 @@ for file in os.listdir(folder_path):
     if file.endswith(".c") and file not in processed_files:
         full_path = os.path.join(folder_path, file)
         try:
-            generator.process_file(full_path)
+            try:
+                digest, signature = dedup_index.fingerprint(full_path)
+                match, similarity = dedup_index.query(digest, signature, current_toolchain)
+            except Exception as e:
+                print(f"[!] Dedup lookup failed for {file}: {e}")
+                digest = match = None
+            if match is not None:
+                print(f"[=] {file} duplicates {match['source']} (similarity {similarity:.2f})")
+            label, margin = generator.process_file(full_path, reuse=match)
+            if digest is not None and match is None:
+                dedup_index.insert(full_path, digest, signature, label, margin, current_toolchain)
             processed_files.add(file)
             with open(processed_file_list, 'a') as f:
                 f.write(file + "\n")
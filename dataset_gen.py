@@ -2,13 +2,21 @@ import subprocess
 import os
 import csv
 import tempfile
+from workload import WorkloadManifest, WorkloadRunner
+from toolchain import CC, toolchain_id, runner_up_margin
 
 class DatasetGenerator:
-    def __init__(self, csv_file='code_dataset.csv'):
+    def __init__(self, csv_file='code_dataset.csv', dynamic=None, measurements=None):
         # Map codes to flags
         self.opt_level_map = {'0': '-O0', '1': '-O1', '2': '-O2', '3': '-O3', 's': '-Os'}
         self.features = ["add", "mul", "load", "store", "call", "define", "br i1", "loops"]
         self.csv_file = csv_file
+        self.workload_runner = WorkloadRunner()
+        self._manifests = {}
+        # Optional DynamicFeatureExtractor; its features follow the static ones
+        self.dynamic = dynamic
+        # Optional MeasurementStore; every timing taken while labelling is kept there
+        self.measurements = measurements
 
     def count_instruction(self, filename, keyword):
         try:
@@ -37,10 +45,19 @@ class DatasetGenerator:
         except:
             return 0
 
+    def get_workload(self, c_file):
+        # Manifests are parsed once per program and shared by every candidate
+        if c_file not in self._manifests:
+            self._manifests[c_file] = WorkloadManifest.for_source(c_file)
+        return self._manifests[c_file]
+
     def compile_and_measure(self, c_file, opt_flag):
         out_exec = tempfile.mktemp()
         try:
-            subprocess.run(f"clang {opt_flag} {c_file} -o {out_exec} -lm", shell=True, check=True)
+            subprocess.run(f"{CC} {opt_flag} {c_file} -o {out_exec} -lm", shell=True, check=True)
+            manifest = self.get_workload(c_file)
+            if manifest is not None:
+                return self.workload_runner.projected_cost(out_exec, manifest)
             result = subprocess.check_output(f"/usr/bin/time -f '%e' {out_exec}", shell=True, stderr=subprocess.STDOUT)
             exec_time = float(result.strip().splitlines()[-1])
             return exec_time
@@ -64,25 +81,50 @@ class DatasetGenerator:
         feats['total_instructions'] = self.get_instruction_count(ir_file)
 
         os.remove(ir_file)
+        if self.dynamic is not None:
+            feats.update(self.dynamic.extract_features(c_file))
         return feats
 
-    def get_best_optimization_flag(self, c_file):
+    def rank_optimization_flags(self, c_file):
         timings = {}
         for code, flag in self.opt_level_map.items():
             time_taken = self.compile_and_measure(c_file, flag)
             timings[code] = time_taken
-        # Return the code with the best (minimum) time
-        return min(timings, key=timings.get)
+        self.record_timings(c_file, timings.items())
+        # Return the code with the best (minimum) time and its lead over the runner-up
+        return min(timings, key=timings.get), runner_up_margin(timings)
+
+    def record_timings(self, c_file, timings):
+        # model_selection.py reads these back to score predictions by slowdown
+        if self.measurements is None:
+            return
+        for code, time_taken in timings:
+            self.measurements.add(c_file, code, time_taken)
+        self.measurements.save()
+
+    def get_best_optimization_flag(self, c_file):
+        return self.rank_optimization_flags(c_file)[0]
+
+    def row_metadata(self, c_file, margin):
+        return {'source': c_file, 'toolchain': toolchain_id(CC), 'margin': round(margin, 6)}
 
-    def save_to_csv(self, feature_dict, label):
-        header = list(feature_dict.keys()) + ['label']
-        row = list(feature_dict.values()) + [label]
+    def save_to_csv(self, feature_dict, label, metadata=None):
+        fields = dict(feature_dict, **(metadata or {}))
+        header = list(fields.keys()) + ['label']
+        row = list(fields.values()) + [label]
 
         file_exists = os.path.exists(self.csv_file)
         write_header = True
 
         if file_exists and os.path.getsize(self.csv_file) > 0:
             write_header = False
+            with open(self.csv_file, 'r', newline='') as f:
+                existing = next(csv.reader(f), [])
+            if existing != header:
+                # Older datasets predate the metadata columns; keep their layout
+                print(f"[!] {self.csv_file} header differs, writing its columns only")
+                fields['label'] = label
+                row = [fields.get(col, '') for col in existing]
 
         with open(self.csv_file, 'a', newline='') as f:
             writer = csv.writer(f)
@@ -90,8 +132,13 @@ class DatasetGenerator:
                 writer.writerow(header)
             writer.writerow(row)
 
-    def process_file(self, c_file):
+    def process_file(self, c_file, reuse=None):
         feats = self.extract_features(c_file)
-        best_flag_code = self.get_best_optimization_flag(c_file)
-        self.save_to_csv(feats, best_flag_code)
+        if reuse is None:
+            best_flag_code, margin = self.rank_optimization_flags(c_file)
+        else:
+            # Duplicate of an already benchmarked program (a DedupIndex entry)
+            best_flag_code, margin = reuse['label'], reuse['margin']
+        self.save_to_csv(feats, best_flag_code, self.row_metadata(c_file, margin))
         print(f"[✓] Processed {c_file}, best flag code: {best_flag_code}")
+        return best_flag_code, margin
@@ -5,13 +5,21 @@ import tempfile
 import random
 
 import random
+from workload import WorkloadManifest, WorkloadRunner
+from toolchain import CC, toolchain_id, runner_up_margin
 
 class DatasetGenerator:
-    def __init__(self, csv_file='code_dataset.csv'):
+    def __init__(self, csv_file='code_dataset.csv', dynamic=None, measurements=None):
         self.opt_level_map = {'0': '-O0', '1': '-O1', '2': '-O2', '3': '-O3', 's': '-Os'}
         self.binary_flags = {'f': '-fomit-frame-pointer', 'u': '-funroll-loops'}
         self.features = ["add", "mul", "load", "store", "call", "define", "br i1", "loops"]
         self.csv_file = csv_file
+        self.workload_runner = WorkloadRunner()
+        self._manifests = {}
+        # Optional DynamicFeatureExtractor; its features follow the static ones
+        self.dynamic = dynamic
+        # Optional MeasurementStore; every timing taken while labelling is kept there
+        self.measurements = measurements
 
         # Genetic algorithm params
         self.POPULATION_SIZE = 6
@@ -46,6 +54,12 @@ class DatasetGenerator:
         except:
             return 0
 
+    def get_workload(self, c_file):
+        # Manifests are parsed once per program and shared by every candidate
+        if c_file not in self._manifests:
+            self._manifests[c_file] = WorkloadManifest.for_source(c_file)
+        return self._manifests[c_file]
+
     def compile_and_measure(self, c_file, flag_code):
         out_exec = tempfile.mktemp()
         try:
@@ -56,7 +70,10 @@ class DatasetGenerator:
             else:
                 return float('inf')
 
-            subprocess.run(f"clang {flag} {c_file} -o {out_exec} -lm", shell=True, check=True)
+            subprocess.run(f"{CC} {flag} {c_file} -o {out_exec} -lm", shell=True, check=True)
+            manifest = self.get_workload(c_file)
+            if manifest is not None:
+                return self.workload_runner.projected_cost(out_exec, manifest)
             result = subprocess.check_output(f"/usr/bin/time -f '%e' {out_exec}", shell=True, stderr=subprocess.STDOUT)
             exec_time = float(result.strip().splitlines()[-1])
             return exec_time
@@ -80,6 +97,8 @@ class DatasetGenerator:
         feats['total_instructions'] = self.get_instruction_count(ir_file)
 
         os.remove(ir_file)
+        if self.dynamic is not None:
+            feats.update(self.dynamic.extract_features(c_file))
         return feats
     
 
@@ -112,13 +131,18 @@ class DatasetGenerator:
             return random.choice(list(self.opt_level_map.keys()))
 
 
-    def get_best_optimization_flag(self, c_file):
+    def rank_optimization_flags(self, c_file):
         population = self.generate_initial_population()
         best_combination = None
         best_time = float('inf')
+        # Best time seen per combination across all generations, for the margin
+        timings = {}
 
         for _ in range(self.GENERATIONS):
             scores = [(combo, self.compile_and_measure(c_file, combo)) for combo in population]
+            for combo, t in scores:
+                timings[combo] = min(t, timings.get(combo, float('inf')))
+            self.record_timings(c_file, scores)
             scores.sort(key=lambda x: x[1])
             best_combination, best_time = scores[0]
 
@@ -136,18 +160,39 @@ class DatasetGenerator:
                 new_population.append(child)
             population = new_population
 
-        return best_combination
+        return best_combination, runner_up_margin(timings)
+
+    def record_timings(self, c_file, timings):
+        # model_selection.py reads these back to score predictions by slowdown
+        if self.measurements is None:
+            return
+        for code, time_taken in timings:
+            self.measurements.add(c_file, code, time_taken)
+        self.measurements.save()
 
+    def get_best_optimization_flag(self, c_file):
+        return self.rank_optimization_flags(c_file)[0]
+
+    def row_metadata(self, c_file, margin):
+        return {'source': c_file, 'toolchain': toolchain_id(CC), 'margin': round(margin, 6)}
 
-    def save_to_csv(self, feature_dict, label):
-        header = list(feature_dict.keys()) + ['label']
-        row = list(feature_dict.values()) + [label]
+    def save_to_csv(self, feature_dict, label, metadata=None):
+        fields = dict(feature_dict, **(metadata or {}))
+        header = list(fields.keys()) + ['label']
+        row = list(fields.values()) + [label]
 
         file_exists = os.path.exists(self.csv_file)
         write_header = True
 
         if file_exists and os.path.getsize(self.csv_file) > 0:
             write_header = False
+            with open(self.csv_file, 'r', newline='') as f:
+                existing = next(csv.reader(f), [])
+            if existing != header:
+                # Older datasets predate the metadata columns; keep their layout
+                print(f"[!] {self.csv_file} header differs, writing its columns only")
+                fields['label'] = label
+                row = [fields.get(col, '') for col in existing]
 
         with open(self.csv_file, 'a', newline='') as f:
             writer = csv.writer(f)
@@ -156,8 +201,13 @@ class DatasetGenerator:
             writer.writerow(row)
             
 
-    def process_file(self, c_file):
+    def process_file(self, c_file, reuse=None):
         feats = self.extract_features(c_file)
-        best_flag_code = self.get_best_optimization_flag(c_file)
-        self.save_to_csv(feats, best_flag_code)
+        if reuse is None:
+            best_flag_code, margin = self.rank_optimization_flags(c_file)
+        else:
+            # Duplicate of an already benchmarked program (a DedupIndex entry)
+            best_flag_code, margin = reuse['label'], reuse['margin']
+        self.save_to_csv(feats, best_flag_code, self.row_metadata(c_file, margin))
         print(f"[✓] Processed {c_file}, best flag code: {best_flag_code}")
+        return best_flag_code, margin
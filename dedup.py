@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+from workload import MANIFEST_SUFFIX
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+NGRAM = 3
+SIMILARITY_THRESHOLD = 0.9
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed permutation parameters so signatures stay comparable across runs
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], 'little') % (_MERSENNE_PRIME - 1) + 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], 'little') % _MERSENNE_PRIME)
+    for i in range(NUM_PERM)
+]
+
+_LOCAL_NAME = re.compile(r'%[-a-zA-Z$._0-9"]+')
+_GLOBAL_NAME = re.compile(r'@[-a-zA-Z$._0-9"]+')
+_METADATA = re.compile(r',?\s*![\w.]+\s+!\d+')
+_ATTR_GROUP = re.compile(r'#\d+')
+_OPCODE = re.compile(r'^(?:%\S+\s*=\s*)?([a-z][a-z0-9_.]*)')
+# Integer and float literals, but not the digits of type names like i32
+_CONSTANT = re.compile(r'(?<![\w%@.#])-?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b')
+
+
+def normalize_ir(ir_text):
+    """
+    Strips everything from -O0 IR that changes when a program is merely
+    renamed: module/source names, comments, metadata, attribute groups and
+    the names of locals, labels and the globals and functions the module
+    defines. Declared callees and llvm.* intrinsics keep their names, so a
+    call to sin never looks like a call to exp.
+    """
+    defined = set()
+    for line in ir_text.splitlines():
+        if line.startswith('define '):
+            m = _GLOBAL_NAME.search(line)
+            if m:
+                defined.add(m.group(0))
+        elif line.startswith('@'):
+            defined.add(_GLOBAL_NAME.match(line).group(0))
+
+    def rename_global(m):
+        return '@g' if m.group(0) in defined else m.group(0)
+
+    lines = []
+    for line in ir_text.splitlines():
+        line = line.split(';', 1)[0].rstrip()
+        if not line or line.startswith(('source_filename', 'target ', '!', 'attributes #')):
+            continue
+        line = _METADATA.sub('', line)
+        line = _ATTR_GROUP.sub('#', line)
+        line = _LOCAL_NAME.sub('%v', line)
+        line = _GLOBAL_NAME.sub(rename_global, line)
+        if re.match(r'^[-a-zA-Z$._0-9"]+:', line):
+            line = 'label:'
+        lines.append(line.strip())
+    return "\n".join(lines)
+
+
+def opcode_sequence(normalized_ir):
+    """
+    One token per instruction: the opcode followed by its constant operands
+    and any external symbols it names, e.g. `icmp:10` or `call:@sin`.
+    Keeping these means a loop bound of 10 and one of 1000000000, or a call
+    to sin and one to exp, produce different shingles even though the
+    opcodes match.
+    """
+    ops = []
+    for line in normalized_ir.splitlines():
+        if line in ('label:', '}') or line.startswith(('define', 'declare', '@g')):
+            ops.append(line.split(' ', 1)[0])
+            continue
+        m = _OPCODE.match(line)
+        if m:
+            rest = line[m.end():]
+            externals = [name for name in _GLOBAL_NAME.findall(rest) if name != '@g']
+            ops.append(":".join([m.group(1)] + _CONSTANT.findall(rest) + externals))
+    return ops
+
+
+def minhash_signature(ops, salt=b""):
+    """
+    MinHash of the token n-grams. Every shingle is hashed with `salt`, so
+    signatures with different salts share no values and never match.
+    """
+    shingles = {" ".join(ops[i:i + NGRAM]) for i in range(max(1, len(ops) - NGRAM + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(salt + s.encode(), digest_size=4).digest(), 'little')
+              for s in shingles]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(sig1, sig2):
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+def _band_keys(signature):
+    return [f"{b}:" + ",".join(str(v) for v in signature[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND])
+            for b in range(BANDS)]
+
+
+class DedupIndex:
+    """
+    Finds programs that are exact or near-duplicates of ones already labelled.
+
+    Each program is reduced to its normalized -O0 IR. An exact SHA-256 of
+    that text catches renamed copies; a MinHash signature over n-grams of
+    opcodes and their constant operands, bucketed with LSH banding, catches
+    copies with small edits. A program's workload manifest is hashed into
+    both, so the same code benchmarked on different inputs is never a
+    duplicate.
+    Entries are appended to a JSON-lines file so inserts are O(1) on disk
+    and the whole index is rebuilt in memory on load.
+    """
+
+    def __init__(self, index_file='dedup_index.jsonl', threshold=SIMILARITY_THRESHOLD):
+        self.index_file = index_file
+        self.threshold = threshold
+        self.entries = []
+        self.exact = {}
+        self.buckets = {}
+        if os.path.exists(index_file):
+            with open(index_file, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _add(self, entry):
+        idx = len(self.entries)
+        self.entries.append(entry)
+        self.exact.setdefault(entry['hash'], []).append(idx)
+        for key in _band_keys(entry['signature']):
+            self.buckets.setdefault(key, []).append(idx)
+
+    def fingerprint(self, c_file):
+        """
+        Returns (exact hash, MinHash signature) of a C file's normalized -O0
+        IR together with its workload manifest, if it has one.
+        """
+        with tempfile.NamedTemporaryFile(suffix=".ll", delete=False) as tmp_ll:
+            ir_file = tmp_ll.name
+        try:
+            subprocess.run(
+                ["clang", "-O0", "-S", "-emit-llvm", c_file, "-o", ir_file],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            with open(ir_file, 'r', encoding='utf-8', errors='ignore') as f:
+                normalized = normalize_ir(f.read())
+        finally:
+            if os.path.exists(ir_file):
+                os.remove(ir_file)
+        manifest = os.path.splitext(c_file)[0] + MANIFEST_SUFFIX
+        salt = b""
+        if os.path.exists(manifest):
+            with open(manifest, 'rb') as f:
+                salt = hashlib.sha256(f.read()).digest()
+        digest = hashlib.sha256(salt + normalized.encode()).hexdigest()
+        return digest, minhash_signature(opcode_sequence(normalized), salt)
+
+    def query(self, digest, signature, toolchain=None):
+        """
+        Returns (entry, similarity) for the closest indexed program at or
+        above the threshold, or (None, 0.0) when there is none. With
+        `toolchain` set, only labels measured by that toolchain are reused.
+        """
+        def usable(idx):
+            return toolchain is None or self.entries[idx].get('toolchain') == toolchain
+
+        for idx in self.exact.get(digest, ()):
+            if usable(idx):
+                return self.entries[idx], 1.0
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates.update(idx for idx in self.buckets.get(key, ()) if usable(idx))
+        best, best_sim = None, 0.0
+        for idx in candidates:
+            sim = estimate_similarity(signature, self.entries[idx]['signature'])
+            if sim > best_sim:
+                best, best_sim = self.entries[idx], sim
+        if best_sim < self.threshold:
+            return None, 0.0
+        return best, best_sim
+
+    def insert(self, source, digest, signature, label, margin, toolchain):
+        entry = {'source': source, 'hash': digest, 'signature': signature,
+                 'label': label, 'margin': margin, 'toolchain': toolchain}
+        self._add(entry)
+        with open(self.index_file, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from workload import MANIFEST_SUFFIX, WorkloadManifest
+from toolchain import CC, toolchain_id
+
+RUSAGE_FEATURES = [
+    "max_rss_kb", "minor_faults", "major_faults",
+    "vol_ctx_switches", "invol_ctx_switches", "user_time", "sys_time"
+]
+COVERAGE_FEATURES = ["block_exec_total", "block_exec_max"]
+# Bumped whenever the way rusage is collected changes, so old cache entries are not reused
+RUSAGE_METHOD = b"launcher-v2"
+
+# Tiny fork/exec helper the program is run under. The kernel carries the
+# exec'ing process's peak RSS into the new image's ru_maxrss, and Popen
+# spawns through vfork, so waiting on the program directly from Python
+# reports the interpreter's footprint. Forking from this launcher instead
+# makes that floor a few hundred kilobytes. It reports the exit status,
+# whether the timeout fired and the child's rusage. Usage:
+#   launcher <report file> <timeout seconds> <program> [args...]
+LAUNCHER_SOURCE = r"""
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static pid_t child;
+static volatile sig_atomic_t timed_out;
+
+static void on_alarm(int sig) { (void)sig; timed_out = 1; if (child > 0) kill(child, SIGKILL); }
+
+int main(int argc, char **argv) {
+    int status;
+    struct rusage ru;
+    FILE *out;
+    if (argc < 4 || !(out = fopen(argv[1], "w"))) return 2;
+    signal(SIGALRM, on_alarm);
+    child = fork();
+    if (child < 0) return 2;
+    if (child == 0) { execv(argv[3], argv + 3); _exit(127); }
+    alarm((unsigned)atoi(argv[2]));
+    while (wait4(child, &status, 0, &ru) < 0) {}
+    fprintf(out, "%d %d %ld %ld %ld %ld %ld %.6f %.6f\n",
+            WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status), (int)timed_out,
+            ru.ru_maxrss, ru.ru_minflt, ru.ru_majflt, ru.ru_nvcsw, ru.ru_nivcsw,
+            ru.ru_utime.tv_sec + ru.ru_utime.tv_usec / 1e6,
+            ru.ru_stime.tv_sec + ru.ru_stime.tv_usec / 1e6);
+    fclose(out);
+    return 0;
+}
+"""
+
+
+class DynamicFeatureExtractor:
+    """
+    Collects runtime behaviour from one short -O0 execution of a program.
+
+    The child's rusage (peak RSS, page faults, context switches and the
+    user/sys split), taken through a small compiled launcher so none of it
+    is inherited from this process, tells compute-bound code apart from memory-bound code,
+    which static IR counts cannot. With `coverage=True` the program is built
+    with clang's profile instrumentation and basic-block execution counts are
+    added as well. Results are cached on disk by source hash and toolchain
+    fingerprint, so a program is only executed once per compiler no matter
+    how many times its features are requested. The program's exit status
+    does not matter, since the rusage of a run that returns 1 is just as
+    real; runs that time out or cannot be launched are never cached.
+    """
+
+    def __init__(self, cache_dir='.dynamic_feature_cache', coverage=False, timeout=10):
+        self.cache_dir = cache_dir
+        self.coverage = coverage
+        self.timeout = timeout
+        self.feature_names = RUSAGE_FEATURES + (COVERAGE_FEATURES if coverage else [])
+
+    @classmethod
+    def from_env(cls):
+        """Returns an extractor if OPTIML_DYNAMIC_FEATURES is set, otherwise None."""
+        if os.environ.get("OPTIML_DYNAMIC_FEATURES", "0") in ("", "0"):
+            return None
+        return cls(
+            cache_dir=os.environ.get("OPTIML_DYNAMIC_CACHE", '.dynamic_feature_cache'),
+            coverage=os.environ.get("OPTIML_COVERAGE", "0") not in ("", "0")
+        )
+
+    def cache_key(self, c_file):
+        h = hashlib.sha256()
+        # The manifest decides what the run is fed, so editing it invalidates the entry
+        manifest = os.path.splitext(c_file)[0] + MANIFEST_SUFFIX
+        for path in (c_file, manifest):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+        h.update(b"coverage" if self.coverage else b"rusage")
+        h.update(RUSAGE_METHOD)
+        h.update(toolchain_id(CC).encode())
+        if self.coverage:
+            h.update(self._coverage_toolchain().encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def _coverage_toolchain():
+        # Without clang the coverage run falls back to zero counts, so key on that instead
+        try:
+            return toolchain_id("clang")
+        except FileNotFoundError:
+            return "no-clang"
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def extract_features(self, c_file):
+        key = self.cache_key(c_file)
+        cached = self._cache_path(key)
+        if os.path.exists(cached):
+            with open(cached, 'r') as f:
+                feats = json.load(f)
+            feats.pop('toolchain', None)
+            return feats
+
+        workdir = tempfile.mkdtemp()
+        try:
+            feats = self._measure_rusage(c_file, workdir)
+            coverage = self._measure_coverage(c_file, workdir) if self.coverage else {}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if feats is None or coverage is None:
+            # Report zeros for this call only, so the next request measures again
+            feats = feats or {name: 0 for name in RUSAGE_FEATURES}
+            if self.coverage:
+                feats.update(coverage or {name: 0 for name in COVERAGE_FEATURES})
+            return feats
+        feats.update(coverage)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cached, 'w') as f:
+            json.dump(dict(feats, toolchain=toolchain_id(CC)), f)
+        return feats
+
+    def _run_input(self, c_file):
+        # Use the smallest workload size so the run stays short
+        manifest = WorkloadManifest.for_source(c_file)
+        if manifest is None:
+            return [], None, None
+        entry = manifest.sizes[0]
+        stdin_data = None
+        if entry.get("stdin"):
+            with open(manifest.resolve(entry["stdin"]), 'rb') as f:
+                stdin_data = f.read()
+        return [str(a) for a in entry.get("argv", [])], stdin_data, manifest.base_dir
+
+    def _launcher(self):
+        """Builds the rusage launcher once per toolchain and returns its path."""
+        path = os.path.join(self.cache_dir, f"rusage_launcher_{toolchain_id(CC)[:12]}")
+        if os.path.exists(path):
+            return path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        src = path + f".{os.getpid()}.c"
+        with open(src, 'w') as f:
+            f.write(LAUNCHER_SOURCE)
+        try:
+            subprocess.run(
+                [CC, "-O2", src, "-o", path + ".tmp"],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            os.replace(path + ".tmp", path)
+        finally:
+            os.remove(src)
+        return path
+
+    def _execute(self, exe, c_file, env=None):
+        """
+        Runs `exe` once under the launcher and returns the child's rusage as
+        (maxrss_kb, minflt, majflt, nvcsw, nivcsw, utime, stime) whatever its
+        exit status, or None if it timed out or could not be launched.
+        """
+        argv, stdin_data, cwd = self._run_input(c_file)
+        report = os.path.join(os.path.dirname(exe), "rusage.txt")
+        feed = {"input": stdin_data} if stdin_data is not None else {"stdin": subprocess.DEVNULL}
+        try:
+            subprocess.run(
+                [self._launcher(), report, str(self.timeout), os.path.abspath(exe)] + argv,
+                check=True, cwd=cwd, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=self.timeout + 5, **feed
+            )
+            with open(report, 'r') as f:
+                fields = f.read().split()
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            return None
+        if len(fields) != 9 or fields[1] != "0":
+            return None
+        return tuple(int(v) for v in fields[2:7]) + tuple(float(v) for v in fields[7:])
+
+    def _measure_rusage(self, c_file, workdir):
+        exe = os.path.join(workdir, "dyn_O0")
+        subprocess.run(
+            [CC, "-O0", c_file, "-o", exe, "-lm"],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        usage = self._execute(exe, c_file)
+        if usage is None:
+            print(f"[!] Dynamic run failed for {c_file}")
+            return None
+        # ru_maxrss is reported in kilobytes on Linux
+        feats = dict(zip(RUSAGE_FEATURES, usage))
+        feats["user_time"] = round(feats["user_time"], 6)
+        feats["sys_time"] = round(feats["sys_time"], 6)
+        return feats
+
+    def _measure_coverage(self, c_file, workdir):
+        exe = os.path.join(workdir, "dyn_cov")
+        raw = os.path.join(workdir, "run.profraw")
+        merged = os.path.join(workdir, "run.profdata")
+        try:
+            subprocess.run(
+                ["clang", "-O0", "-fprofile-instr-generate", "-fcoverage-mapping",
+                 c_file, "-o", exe, "-lm"],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            env = dict(os.environ, LLVM_PROFILE_FILE=raw)
+            if self._execute(exe, c_file, env=env) is None or not os.path.exists(raw):
+                print(f"[!] Coverage run failed for {c_file}")
+                return None
+            subprocess.run(
+                ["llvm-profdata", "merge", "-o", merged, raw],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            report = subprocess.check_output(
+                ["llvm-profdata", "show", "--all-functions", "--counts", merged],
+                text=True, stderr=subprocess.DEVNULL
+            )
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            # No clang or llvm-profdata: that stays true, so the zeros are cached
+            print(f"[!] Coverage unavailable for {c_file}")
+            return {name: 0 for name in COVERAGE_FEATURES}
+        return parse_block_counts(report)
+
+
+def parse_block_counts(report):
+    """Sums and maxes the per-block counters printed by `llvm-profdata show --counts`."""
+    counts = []
+    for line in report.splitlines():
+        line = line.strip()
+        if line.startswith("Function count:"):
+            counts.append(int(line.split(":", 1)[1]))
+        elif line.startswith("Block counts:"):
+            counts.extend(int(c) for c in re.findall(r'\d+', line.split(":", 1)[1]))
+    return {
+        "block_exec_total": sum(counts),
+        "block_exec_max": max(counts) if counts else 0,
+    }
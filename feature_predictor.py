@@ -3,17 +3,25 @@ import re
 import tempfile
 from flask import Flask, request, render_template_string, redirect, flash
 import joblib
-import pandas as pd
-import numpy as np
 import subprocess
+from dynamic_features import DynamicFeatureExtractor
+from compiler_flags import decode_flag_code
+from flag_ranking import rank_flag_combinations
 
 # --- Feature extraction and prediction logic ---
 class PredictFeatureExtractor:
-    def __init__(self):
+    def __init__(self, dynamic=None):
         self.features_list = [
             "add", "mul", "load", "store", "call",
             "define", "br i1", "loops", "basic_blocks", "total_instructions"
         ]
+        # Optional DynamicFeatureExtractor; must match what the model was trained on
+        self.dynamic = dynamic
+
+    def columns(self):
+        if self.dynamic is None:
+            return list(self.features_list)
+        return self.features_list + self.dynamic.feature_names
 
     def _count_in_ir(self, ir_filename, pattern):
         cnt = 0
@@ -64,6 +72,8 @@ class PredictFeatureExtractor:
                     feature_dict[feature] = self.count_instruction_c_source(c_file_path, "loops")
                 else:
                     feature_dict[feature] = self.count_instruction(temp_ir_file, feature)
+            if self.dynamic is not None:
+                feature_dict.update(self.dynamic.extract_features(c_file_path))
         except subprocess.CalledProcessError:
             return {}
         finally:
@@ -73,21 +83,14 @@ class PredictFeatureExtractor:
 
 
 def predict_optimization_flags(c_file_path, model, feature_extractor):
-    features = feature_extractor.extract_features(c_file_path)
-    if not features:
+    # Top-1 of rank_flag_combinations, split into (opt level, frame-pointer, unroll)
+    ranked = rank_flag_combinations(c_file_path, model, feature_extractor, k=1)
+    if not ranked:
         return None, None, None
-    cols = [
-        "add", "mul", "load", "store", "call",
-        "define", "br i1", "loops", "basic_blocks", "total_instructions"
-    ]
-    df = pd.DataFrame([[features.get(c, 0) for c in cols]], columns=cols)
-    preds = model.predict(df)
-    row = preds.flatten()
-    opt_idx = int(np.argmax(row[:5]))
-    opt_map = {0: "O0", 1: "O1", 2: "O2", 3: "O3", 4: "Os"}
-    opt_flag = opt_map.get(opt_idx, "O0")
-    f_flag = "fomit-frame-pointer" if row[5] >= 0.5 else None
-    u_flag = "funroll-loops" if row[6] >= 0.5 else None
+    flags = decode_flag_code(ranked[0][0])
+    opt_flag = [f for f in flags if f.startswith("-O")][-1][1:]
+    f_flag = "fomit-frame-pointer" if "-fomit-frame-pointer" in flags else None
+    u_flag = "funroll-loops" if "-funroll-loops" in flags else None
     return opt_flag, f_flag, u_flag
 
 # --- Flask App ---
@@ -100,7 +103,8 @@ try:
     model = joblib.load(MODEL_PATH)
 except Exception as e:
     raise RuntimeError(f"Failed to load model: {e}")
-extractor = PredictFeatureExtractor()
+# Dynamic features execute the submitted program, so they are opt-in
+extractor = PredictFeatureExtractor(dynamic=DynamicFeatureExtractor.from_env())
 
 # HTML template with Bootstrap, Animate.css, spinner, editor & file upload
 TEMPLATE = '''
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+from benchmark_runner import compile_and_run
+from compiler_flags import decode_flag_code
+
+DEFAULT_TOP_K = 3
+
+
+def rank_flag_combinations(c_file_path, model, feature_extractor, k=DEFAULT_TOP_K):
+    """
+    Returns the k most likely flag codes for a C file as (code, probability)
+    pairs, best first, or an empty list if features could not be extracted.
+
+    Probabilities come from the model's predict_proba over every label it was
+    trained on. random_forest.py calibrates them when every label has at
+    least two training rows, so they can be compared across programs and used
+    to decide how many candidates to verify; otherwise they are the forest's
+    raw vote fractions and only their order is meaningful.
+    """
+    import pandas as pd
+    features = feature_extractor.extract_features(c_file_path)
+    if not features:
+        return []
+    cols = feature_extractor.columns()
+    df = pd.DataFrame([[features.get(c, 0) for c in cols]], columns=cols)
+    probs = model.predict_proba(df)[0]
+    ranked = sorted(zip(model.classes_, probs), key=lambda x: x[1], reverse=True)
+    return [(str(code), float(p)) for code, p in ranked[:k]]
+
+
+def verify_top_k(c_file_path, ranked):
+    """
+    Benchmarks only the ranked candidates and returns (best code, timings).
+
+    This replaces a full flag search with k runs while still catching cases
+    where the model's first choice is not actually the fastest.
+    """
+    workdir = tempfile.mkdtemp()
+    try:
+        timings = {}
+        for code, _ in ranked:
+            exe = os.path.join(workdir, f"verify_{code}")
+            timings[code] = compile_and_run(c_file_path, decode_flag_code(code) + ["-lm"], output_bin=exe)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    best = min(timings, key=timings.get)
+    if timings[best] == float('inf'):
+        return None, timings
+    return best, timings
@@ -1,9 +1,12 @@
+import argparse
 import os
 import random
 import subprocess
 import time
-from compiler_flags import all_flags, generate_random_flags, apply_flags
+from compiler_flags import all_flags, generate_random_flags, apply_flags, decode_flag_code
 from benchmark_runner import compile_and_run
+from suite_tuning import tune_suite
+from per_function import PerFunctionTuner
 
 # GA hyperparameters
 POP_SIZE = 20
@@ -54,5 +57,32 @@ def main():
     best_flags = apply_flags(population[best_idx])
     print("\n🏁 Final best flag combination:", best_flags)
 
+def main_suite(directory, workers=None):
+    ranking = tune_suite(directory, workers=workers)
+    best_code, speedup = ranking[0]
+    print(f"\n🏁 Best flag set for {directory}:", decode_flag_code(best_code),
+          f"geomean speedup over -O0: {speedup:.3f}x")
+
+def main_per_function(source):
+    report = PerFunctionTuner(source).tune()
+    print(f"\nWhole-file best: {report['whole_file_flag']} ({report['whole_file_time']:.4f}s)")
+    for name in report['functions']:
+        print(f"  {name}: {report['per_function_flags'].get(name, report['whole_file_flag'])}")
+    print(f"🏁 Per-function build: {report['per_function_time']:.4f}s, "
+          f"speedup over best whole-file flags: {report['speedup_vs_whole_file']:.3f}x")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Search compiler flags with a genetic algorithm")
+    parser.add_argument("--suite", metavar="DIR",
+                        help="tune one flag set for every .c file in DIR instead of C_SOURCE")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel benchmark jobs in suite mode")
+    parser.add_argument("--per-function", action="store_true",
+                        help="tune an optimization level per function of C_SOURCE (needs gcc)")
+    args = parser.parse_args()
+    if args.suite:
+        main_suite(args.suite, args.workers)
+    elif args.per_function:
+        main_per_function(C_SOURCE)
+    else:
+        main()
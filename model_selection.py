@@ -0,0 +1,237 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import time
+import joblib
+from joblib import Memory, Parallel, delayed
+from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import accuracy_score, balanced_accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.class_weight import compute_sample_weight
+from random_forest import calibrate, load_dataset
+from suite_tuning import LABEL_STORE, MeasurementStore
+
+# Estimator families and the hyperparameter grid searched for each
+SEARCH_SPACE = {
+    "random_forest": (
+        lambda **p: RandomForestClassifier(random_state=42, n_jobs=1, **p),
+        {"n_estimators": [100, 300], "max_depth": [None, 12], "class_weight": [None, "balanced"]},
+    ),
+    "extra_trees": (
+        lambda **p: ExtraTreesClassifier(random_state=42, n_jobs=1, **p),
+        {"n_estimators": [100, 300], "max_depth": [None, 12], "class_weight": [None, "balanced"]},
+    ),
+    "hist_gradient_boosting": (
+        lambda **p: HistGradientBoostingClassifier(random_state=42, **p),
+        {"learning_rate": [0.05, 0.1], "max_depth": [None, 6], "class_weight": [None, "balanced"]},
+    ),
+    "knn": (
+        lambda **p: make_pipeline(StandardScaler(), KNeighborsClassifier(**p)),
+        {"n_neighbors": [3, 7], "weights": ["uniform", "distance"]},
+    ),
+}
+
+
+def expand_grid(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def build_model(family, params, y, calibrated=False):
+    """
+    Returns (unfitted model, fit kwargs) for a grid point.
+
+    class_weight='balanced' is applied as per-row sample weights rather than
+    passed to the estimator, which keeps the families comparable and avoids
+    forest class_weight handling tripping over numeric-looking labels like "0".
+    """
+    factory, _ = SEARCH_SPACE[family]
+    params = dict(params)
+    class_weight = params.pop("class_weight", None)
+    model = factory(**params)
+    if calibrated:
+        model = calibrate(model, y)
+    fit_kwargs = {}
+    if class_weight == "balanced":
+        fit_kwargs["sample_weight"] = compute_sample_weight("balanced", y)
+    return model, fit_kwargs
+
+
+def prepare_folds(csv_file_path, csv_mtime, n_splits, measurement_files, seed=42):
+    """
+    Loads the dataset once and returns everything each CV task needs:
+    the feature matrix, labels, stratified fold indices and per-row oracle
+    timings. Memoized on disk by the caller, keyed by the paths and mtimes
+    of the dataset and of every measurements file, so repeated searches
+    skip parsing and re-splitting but new measurements are picked up.
+
+    `measurement_files` is a sequence of (path, mtime) pairs in priority
+    order. Each row takes its timings from the first store that has any,
+    so one row never mixes runs measured in different ways.
+    """
+    X, y, df = load_dataset(csv_file_path)
+
+    # Stratification needs at least two rows of every label
+    counts = y.value_counts()
+    rare = counts[counts < 2].index.tolist()
+    keep = ~y.isin(rare)
+    X, y, df = X[keep].reset_index(drop=True), y[keep].reset_index(drop=True), df[keep].reset_index(drop=True)
+    n_splits = max(2, min(n_splits, int(y.value_counts().min())))
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(X, y))
+
+    # Median runtime of every measured flag code, for rows that record their source
+    timings = [None] * len(df)
+    stores = [MeasurementStore(path) for path, _ in measurement_files if os.path.exists(path)]
+    if 'source' in df.columns and stores:
+        for i, row in df.iterrows():
+            source = row['source']
+            if not isinstance(source, str) or not os.path.exists(source):
+                continue
+            toolchain = row.get('toolchain') if isinstance(row.get('toolchain'), str) else None
+            for store in stores:
+                codes = {}
+                for code in set(y):
+                    runs = [r for r in store.get(source, code, toolchain) if r > 0]
+                    if runs:
+                        codes[code] = statistics.median(runs)
+                if codes:
+                    timings[i] = codes
+                    break
+
+    return {
+        "X": X.to_numpy(dtype=float), "y": y.to_numpy(dtype=str), "columns": list(X.columns),
+        "folds": folds, "timings": timings, "dropped_labels": rare,
+    }
+
+
+def oracle_slowdowns(y_true, y_pred, timings):
+    """Per-row runtime of the predicted label over the oracle label, where both were measured."""
+    ratios = []
+    for true_code, pred_code, codes in zip(y_true, y_pred, timings):
+        if not codes or true_code not in codes or pred_code not in codes:
+            continue
+        oracle, chosen = codes[true_code], codes[pred_code]
+        if 0 < oracle < float('inf') and chosen < float('inf'):
+            ratios.append(chosen / oracle)
+    return ratios
+
+
+def score_fold(family, params, data, fold_no):
+    train_idx, test_idx = data["folds"][fold_no]
+    model, fit_kwargs = build_model(family, params, data["y"][train_idx])
+    model.fit(data["X"][train_idx], data["y"][train_idx], **fit_kwargs)
+    y_true = data["y"][test_idx]
+    y_pred = model.predict(data["X"][test_idx])
+    return {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "balanced_accuracy": balanced_accuracy_score(y_true, y_pred),
+        "slowdowns": oracle_slowdowns(y_true, y_pred, [data["timings"][i] for i in test_idx]),
+    }
+
+
+def summarize(family, params, fold_results):
+    accs = [r["accuracy"] for r in fold_results]
+    slowdowns = [s for r in fold_results for s in r["slowdowns"]]
+    return {
+        "family": family,
+        "params": params,
+        "accuracy": statistics.mean(accs),
+        "accuracy_std": statistics.pstdev(accs),
+        "balanced_accuracy": statistics.mean(r["balanced_accuracy"] for r in fold_results),
+        # Geometric mean of runtime(predicted) / runtime(oracle); 1.0 is perfect
+        "geomean_slowdown": math.exp(statistics.mean(math.log(s) for s in slowdowns)) if slowdowns else None,
+        "measured_rows": len(slowdowns),
+    }
+
+
+def select_model(csv_file_path, model_save_path='random_forest_optimization_model.joblib',
+                 n_splits=5, n_jobs=-1, cache_dir='.model_selection_cache',
+                 measurements_paths=(LABEL_STORE, 'suite_measurements.json'), select_by='accuracy'):
+    """
+    Runs stratified k-fold CV over every family and grid point in
+    SEARCH_SPACE, one (configuration, fold) task per core, then refits the
+    winner on the full dataset, calibrates it and saves it together with
+    `<model>.eval.json` describing how it was chosen.
+
+    `select_by='slowdown'` ranks by geometric-mean slowdown versus the
+    oracle labels (only rows with stored measurements count) instead of
+    accuracy; ties fall back to the other metric.
+    """
+    memory = Memory(cache_dir, verbose=0)
+    measurement_files = tuple(
+        (os.path.abspath(path), os.path.getmtime(path) if os.path.exists(path) else None)
+        for path in measurements_paths
+    )
+    data = memory.cache(prepare_folds)(
+        os.path.abspath(csv_file_path), os.path.getmtime(csv_file_path), n_splits, measurement_files
+    )
+    if data["dropped_labels"]:
+        print(f"[!] Labels with a single row left out of CV: {data['dropped_labels']}")
+
+    configs = [(family, params) for family, (_, grid) in SEARCH_SPACE.items() for params in expand_grid(grid)]
+    n_folds = len(data["folds"])
+    print(f"Evaluating {len(configs)} configurations x {n_folds} folds on {len(data['y'])} rows")
+
+    start = time.perf_counter()
+    fold_results = Parallel(n_jobs=n_jobs)(
+        delayed(score_fold)(family, params, data, fold_no)
+        for family, params in configs for fold_no in range(n_folds)
+    )
+    results = [summarize(family, params, fold_results[i * n_folds:(i + 1) * n_folds])
+               for i, (family, params) in enumerate(configs)]
+
+    def rank_key(r):
+        slowdown = r["geomean_slowdown"] if r["geomean_slowdown"] is not None else float('inf')
+        if select_by == 'slowdown':
+            return (slowdown, -r["accuracy"])
+        return (-r["accuracy"], slowdown)
+
+    results.sort(key=rank_key)
+    for r in results[:10]:
+        slowdown = f"{r['geomean_slowdown']:.3f}x" if r["geomean_slowdown"] is not None else "n/a"
+        print(f"  {r['family']:<24} acc {r['accuracy']:.4f} ± {r['accuracy_std']:.4f}  "
+              f"slowdown {slowdown} ({r['measured_rows']} rows)  {r['params']}")
+
+    best = results[0]
+    X, y, _ = load_dataset(csv_file_path)
+    model, fit_kwargs = build_model(best["family"], best["params"], y, calibrated=True)
+    model.fit(X, y, **fit_kwargs)
+    # Uncompressed so app.py loads it quickly
+    joblib.dump(model, model_save_path)
+
+    record = {
+        "dataset": os.path.abspath(csv_file_path),
+        "rows": int(len(y)),
+        "features": list(X.columns),
+        "folds": n_folds,
+        "select_by": select_by,
+        "winner": best,
+        "results": results,
+        "search_seconds": round(time.perf_counter() - start, 2),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(model_save_path + ".eval.json", 'w') as f:
+        json.dump(record, f, indent=2, default=str)
+    print(f"--- Best: {best['family']} {best['params']} saved to {model_save_path} ---")
+    return record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validated model selection over estimator families")
+    parser.add_argument("csv_file")
+    parser.add_argument("--model-out", default='random_forest_optimization_model.joblib')
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel CV tasks (-1 = all cores)")
+    parser.add_argument("--cache-dir", default='.model_selection_cache')
+    parser.add_argument("--measurements", nargs='+', default=[LABEL_STORE, 'suite_measurements.json'],
+                        help="MeasurementStore files used for slowdown versus oracle labels, in priority order")
+    parser.add_argument("--select-by", choices=['accuracy', 'slowdown'], default='accuracy')
+    args = parser.parse_args()
+    select_model(args.csv_file, args.model_out, args.folds, args.jobs, args.cache_dir,
+                 args.measurements, args.select_by)
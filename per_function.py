@@ -0,0 +1,226 @@
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+from benchmark_runner import compile_and_run
+from compiler_flags import all_flag_codes, decode_flag_code, opt_level_map
+
+# optimize attributes are a GCC extension; clang ignores them with a warning
+PER_FUNCTION_CC = os.environ.get("OPTIML_GCC", "gcc")
+FUNCTION_FEATURES = ["add", "mul", "load", "store", "call", "br i1"]
+# A change must beat the incumbent by this fraction to be kept, so timing noise is not chased
+MIN_IMPROVEMENT = 0.02
+
+_DEFINITION = re.compile(
+    r'^[ \t]*(?:[A-Za-z_][\w \t\*]*?[\s\*])?([A-Za-z_]\w*)[ \t]*\(([^;{}()]|\([^;{}()]*\))*\)[\s]*\{',
+    re.MULTILINE
+)
+_KEYWORDS = {"if", "for", "while", "switch", "do", "else", "return", "sizeof"}
+
+
+def _blank_comments_and_strings(text):
+    """Replaces comments and string/char literals with spaces, keeping offsets intact."""
+    def blank(m):
+        return re.sub(r'[^\n]', ' ', m.group(0))
+    return re.sub(r'/\*.*?\*/|//[^\n]*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', blank, text, flags=re.S)
+
+
+def find_function_definitions(source_text):
+    """
+    Returns [(name, offset)] for every top-level function definition, where
+    offset is the start of the line holding its declaration specifiers.
+
+    This is a lexical scan in the spirit of the grep-based features, not a
+    C parser: it assumes each definition starts at the beginning of a line
+    and skips prototypes and anything nested inside braces.
+    """
+    code = _blank_comments_and_strings(source_text)
+    depth_at = []
+    depth = 0
+    for ch in code:
+        depth_at.append(depth)
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+    found = []
+    for m in _DEFINITION.finditer(code):
+        name = m.group(1)
+        if name in _KEYWORDS or depth_at[m.start()] != 0:
+            continue
+        indent = len(m.group(0)) - len(m.group(0).lstrip(' \t'))
+        found.append((name, m.start() + indent))
+    return found
+
+
+def extract_function_features(c_file):
+    """
+    Per-function IR counts from clang -O0 IR, keyed by function name.
+
+    Returns an empty dict when clang is unavailable; the search then simply
+    visits functions in source order.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".ll", delete=False) as tmp_ll:
+        ir_file = tmp_ll.name
+    try:
+        subprocess.run(
+            ["clang", "-O0", "-S", "-emit-llvm", c_file, "-o", ir_file],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        with open(ir_file, 'r', encoding='utf-8', errors='ignore') as f:
+            ir_text = f.read()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return {}
+    finally:
+        if os.path.exists(ir_file):
+            os.remove(ir_file)
+
+    functions = {}
+    current = None
+    for line in ir_text.splitlines():
+        if line.startswith("define "):
+            m = re.search(r'@"?([^"(\s]+)"?\(', line)
+            current = m.group(1) if m else None
+            if current:
+                functions[current] = dict.fromkeys(FUNCTION_FEATURES + ["basic_blocks", "total_instructions"], 0)
+            continue
+        if current is None:
+            continue
+        if line.startswith("}"):
+            current = None
+            continue
+        feats = functions[current]
+        for keyword in FUNCTION_FEATURES:
+            if keyword in line:
+                feats[keyword] += 1
+        if re.match(r'^[A-Za-z0-9_.]+:', line):
+            feats["basic_blocks"] += 1
+        elif re.match(r'^\s+[a-z%]', line):
+            feats["total_instructions"] += 1
+    return functions
+
+
+def apply_function_levels(source_text, definitions, choices):
+    """Prefixes each chosen function with __attribute__((optimize("<level>")))."""
+    out = source_text
+    for name, offset in sorted(definitions, key=lambda d: d[1], reverse=True):
+        if name in choices:
+            level = opt_level_map[choices[name]][1:]
+            out = out[:offset] + f'__attribute__((optimize("{level}"))) ' + out[offset:]
+    return out
+
+
+class PerFunctionTuner:
+    """
+    Searches per-function optimization levels for one C file.
+
+    The whole-file best flag set (every code from all_flag_codes()) is
+    measured first and used as the starting point and as the command line.
+    Functions are then visited hottest first (largest -O0 IR) and each is
+    tried at every other -O level via a GCC optimize attribute; a change is
+    kept only if it beats the incumbent by MIN_IMPROVEMENT. The joint space
+    is 5^functions, so this coordinate descent is bounded by `passes` sweeps
+    rather than enumerated.
+
+    The search keeps the minimum of noisy runs, which favours whichever
+    variant got lucky, so the reported speedup comes from fresh, interleaved
+    runs of the final assignment and the whole-file best instead.
+    """
+
+    def __init__(self, c_file, repeats=3, passes=1, compiler=PER_FUNCTION_CC):
+        self.c_file = c_file
+        self.repeats = repeats
+        self.passes = passes
+        self.compiler = compiler
+        with open(c_file, 'r', encoding='utf-8', errors='ignore') as f:
+            self.source_text = f.read()
+        self.definitions = find_function_definitions(self.source_text)
+        self.workdir = tempfile.mkdtemp()
+        self._cache = {}
+
+    def _run(self, base_code, choices):
+        variant = os.path.join(self.workdir, os.path.basename(self.c_file))
+        with open(variant, 'w') as f:
+            f.write(apply_function_levels(self.source_text, self.definitions, choices))
+        flags = decode_flag_code(base_code) + ["-I", os.path.dirname(os.path.abspath(self.c_file)), "-lm"]
+        exe = os.path.join(self.workdir, "variant")
+        return compile_and_run(variant, flags, output_bin=exe, compiler=self.compiler,
+                               workload_source=self.c_file)
+
+    def _measure(self, base_code, choices):
+        key = (base_code, tuple(sorted(choices.items())))
+        if key not in self._cache:
+            self._cache[key] = min(self._run(base_code, choices) for _ in range(self.repeats))
+        return self._cache[key]
+
+    def best_whole_file(self):
+        timings = {code: self._measure(code, {}) for code in all_flag_codes()}
+        best = min(timings, key=timings.get)
+        return best, timings
+
+    def remeasure(self, base_code, choices):
+        """
+        Median runtimes of the whole-file best and of `choices` over fresh,
+        alternating runs, so neither side benefits from the search's minimum.
+        """
+        whole, tuned = [], []
+        for _ in range(self.repeats):
+            whole.append(self._run(base_code, {}))
+            tuned.append(self._run(base_code, choices))
+        return statistics.median(whole), statistics.median(tuned)
+
+    def tune(self):
+        """
+        Returns a report dict with the whole-file best level and runtime, the
+        per-function choices that differ from it, their runtime and the
+        speedup of per-function tuning over the best whole-file flag set.
+        When any function changed level, both times are the re-measured
+        medians rather than the search minima.
+        """
+        try:
+            base_code, whole_file = self.best_whole_file()
+            base_level = base_code[0]
+            features = extract_function_features(self.c_file)
+            names = [name for name, _ in self.definitions]
+            names.sort(key=lambda n: features.get(n, {}).get("total_instructions", 0), reverse=True)
+
+            choices = {}
+            best_time = whole_file[base_code]
+            for _ in range(self.passes):
+                improved = False
+                for name in names:
+                    current = choices.get(name, base_level)
+                    for code in opt_level_map:
+                        if code == current:
+                            continue
+                        trial = dict(choices)
+                        if code == base_level:
+                            trial.pop(name, None)
+                        else:
+                            trial[name] = code
+                        runtime = self._measure(base_code, trial)
+                        if runtime < best_time * (1 - MIN_IMPROVEMENT):
+                            choices, best_time, improved = trial, runtime, True
+                            print(f"  {name}: {opt_level_map[code]} -> {best_time:.4f}s")
+                if not improved:
+                    break
+            if choices:
+                base_time, best_time = self.remeasure(base_code, choices)
+            else:
+                base_time = best_time
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        return {
+            "source": self.c_file,
+            "functions": names,
+            "whole_file_flag": " ".join(decode_flag_code(base_code)),
+            "whole_file_time": base_time,
+            "whole_file_timings": {" ".join(decode_flag_code(c)): t for c, t in whole_file.items()},
+            "per_function_flags": {n: opt_level_map[c] for n, c in choices.items()},
+            "per_function_time": best_time,
+            "speedup_vs_whole_file": base_time / best_time if 0 < best_time < float('inf') else 0.0,
+            "function_features": features,
+        }
@@ -1,10 +1,50 @@
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.metrics import accuracy_score, classification_report, top_k_accuracy_score
 import joblib # For saving and loading the model
+from toolchain import METADATA_COLUMNS
 
-def train_and_save_random_forest_model(csv_file_path, model_save_path='random_forest_optimization_model.joblib'):
+def load_dataset(csv_file_path):
+    """
+    Reads a dataset CSV and returns (X, y, df).
+
+    Labels are flag codes such as "3u", so they are always read as strings.
+    The per-row bookkeeping columns (source, toolchain, margin) stay in `df`
+    but are not part of X.
+    """
+    df = pd.read_csv(csv_file_path, dtype={'label': str})
+    # Appending runs can repeat the header row mid-file
+    df = df[df['label'] != 'label'].reset_index(drop=True)
+
+    # Separate features (X) and labels (y)
+    # Assuming the last column is 'label' and the rest are features
+    X = df.drop(columns=['label'] + [c for c in METADATA_COLUMNS if c in df.columns]).apply(pd.to_numeric)
+    y = df['label']
+    return X, y, df
+
+
+def calibrate(model, y_train):
+    """
+    Wraps an unfitted classifier so predict_proba returns calibrated
+    probabilities over the flag-combination labels.
+
+    Calibration needs every class in each fold, so the number of folds is
+    capped by the rarest label; with fewer than two examples of some label
+    the raw model is returned unchanged and a warning is printed, since its
+    scores are then plain vote fractions.
+    """
+    counts = y_train.value_counts()
+    folds = min(3, int(counts.min()))
+    if folds < 2:
+        rare = sorted(str(label) for label in counts[counts < 2].index)
+        print(f"[!] Skipping probability calibration: labels {rare} have a single training row")
+        return model
+    return CalibratedClassifierCV(model, method='sigmoid', cv=folds)
+
+
+def train_and_save_random_forest_model(csv_file_path, model_save_path='random_forest_optimization_model.joblib', top_k=3):
     """
     Trains a Random Forest Classifier model using data from a CSV file
     and saves the trained model to a .joblib file.
@@ -12,15 +52,12 @@ def train_and_save_random_forest_model(csv_file_path, model_save_path='random_fo
     Args:
         csv_file_path (str): The path to the CSV file containing features and labels.
         model_save_path (str): The file path where the trained model will be saved.
+        top_k (int): How many ranked flag combinations the serving path returns;
+            top-k accuracy is reported for this k.
     """
     try:
         # Load the dataset
-        df = pd.read_csv(csv_file_path)
-
-        # Separate features (X) and labels (y)
-        # Assuming the last column is 'label' and the rest are features
-        X = df.drop('label', axis=1)
-        y = df['label']
+        X, y, _ = load_dataset(csv_file_path)
 
         # Split data into training and testing sets
         # Using a fixed random_state for reproducibility
@@ -28,7 +65,7 @@ def train_and_save_random_forest_model(csv_file_path, model_save_path='random_fo
 
         # Initialize and train the Random Forest Classifier
         # You can tune n_estimators, max_depth, etc., for better performance
-        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        model = calibrate(RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1), y_train)
         model.fit(X_train, y_train)
 
         # Make predictions on the test set
@@ -36,14 +73,26 @@ def train_and_save_random_forest_model(csv_file_path, model_save_path='random_fo
 
         # Evaluate the model
         accuracy = accuracy_score(y_test, y_pred)
-        report = classification_report(y_test, y_pred)
+        report = classification_report(y_test, y_pred, zero_division=0)
+        # Labels only present in the test split cannot be scored against the model's classes
+        seen = y_test.isin(model.classes_).to_numpy()
+        top_k_accuracy = None
+        # With k at or above the number of classes every row scores a hit, so it is not reported
+        if seen.any() and top_k < len(model.classes_):
+            top_k_accuracy = top_k_accuracy_score(
+                y_test[seen], model.predict_proba(X_test[seen]), k=top_k, labels=model.classes_
+            )
 
         print(f"Model Training Complete!")
         print(f"Accuracy: {accuracy:.4f}")
+        if top_k_accuracy is not None:
+            print(f"Top-{top_k} Accuracy: {top_k_accuracy:.4f} ({int(seen.sum())} of {len(y_test)} test rows)")
+        else:
+            print(f"Top-{top_k} Accuracy: n/a")
         print("Classification Report:")
         print(report)
 
-        # Save the trained model using joblib
+        # Save the trained model using joblib, uncompressed so app.py loads it quickly
         joblib.dump(model, model_save_path)
         print(f"--- Model Saved Successfully: {model_save_path} ---")
 
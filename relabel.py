@@ -0,0 +1,94 @@
+import argparse
+import csv
+import os
+from dynamic_features import DynamicFeatureExtractor
+from suite_tuning import LABEL_STORE, MeasurementStore
+from toolchain import CC, toolchain_fingerprint
+
+
+def _margin(row):
+    try:
+        return float(row.get('margin') or 0.0)
+    except ValueError:
+        return 0.0
+
+
+def _write_rows(csv_file, header, rows):
+    tmp_file = csv_file + ".tmp"
+    with open(tmp_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_file, csv_file)
+
+
+def relabel(csv_file, generator, limit=None):
+    """
+    Re-benchmarks only the rows labelled by a different toolchain.
+
+    Features are re-extracted as well, since the IR they are counted from
+    comes from the new toolchain too. Stale rows are processed in order of their recorded margin, smallest
+    first: a label that barely beat its runner-up is the most likely to
+    change under a new compiler. Rows without a margin are treated as
+    zero-margin. The CSV is rewritten after every row so an interrupted run
+    keeps its progress. Returns the number of rows relabelled.
+    """
+    with open(csv_file, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        header = list(reader.fieldnames or [])
+        rows = list(reader)
+
+    if 'source' not in header:
+        print(f"[!] {csv_file} has no source column; re-run create_dataset.py to relabel it")
+        return 0
+    for col in ('toolchain', 'margin'):
+        if col not in header:
+            header.insert(header.index('label'), col)
+
+    current = toolchain_fingerprint(CC)
+    print(f"Current toolchain {current['id']}: {current['version']} ({current['target']})")
+
+    stale, missing = [], 0
+    for row in rows:
+        if row.get('toolchain') == current['id']:
+            continue
+        if row.get('source') and os.path.exists(row['source']):
+            stale.append(row)
+        else:
+            missing += 1
+    stale.sort(key=_margin)
+    if missing:
+        print(f"[!] Skipping {missing} stale rows without a source file")
+    if limit is not None:
+        stale = stale[:limit]
+
+    for done, row in enumerate(stale, 1):
+        old_label = row['label']
+        feats = generator.extract_features(row['source'])
+        row.update({col: value for col, value in feats.items() if col in header})
+        label, margin = generator.rank_optimization_flags(row['source'])
+        row.update(generator.row_metadata(row['source'], margin))
+        row['label'] = label
+        _write_rows(csv_file, header, rows)
+        change = "unchanged" if label == old_label else f"{old_label} -> {label}"
+        print(f"[✓] {done}/{len(stale)} {row['source']}: {change}")
+    return len(stale)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-label dataset rows produced by an outdated compiler")
+    parser.add_argument("csv_file")
+    parser.add_argument("--combination", action="store_true",
+                        help="search flag combinations (dataset_gen_combination) instead of single -O levels")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="re-benchmark at most this many rows, smallest margin first")
+    args = parser.parse_args()
+
+    if args.combination:
+        from dataset_gen_combination import DatasetGenerator
+    else:
+        from dataset_gen import DatasetGenerator
+    # Datasets built with dynamic features need the same extractor to refresh them
+    generator = DatasetGenerator(csv_file=args.csv_file, dynamic=DynamicFeatureExtractor.from_env(),
+                                 measurements=MeasurementStore(LABEL_STORE))
+    relabel(args.csv_file, generator, args.limit)
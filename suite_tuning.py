@@ -0,0 +1,168 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from benchmark_runner import compile_and_run
+from compiler_flags import all_flag_codes, decode_flag_code
+from toolchain import CC, toolchain_id
+from workload import MANIFEST_SUFFIX
+
+BASELINE_CODE = '0'
+# Timings the dataset generators take while labelling. They come from
+# `/usr/bin/time` at 10 ms resolution, so they live apart from the
+# perf_counter runs suite tuning stores in suite_measurements.json
+LABEL_STORE = 'label_measurements.json'
+
+
+class MeasurementStore:
+    """
+    Persistent runtimes per (program, toolchain, flag code).
+
+    Keys combine a hash of the source (and its workload manifest, if any)
+    with the toolchain fingerprint, so edited programs or a new compiler
+    never reuse old numbers. Every repetition is kept; callers use the
+    median. Non-positive runtimes are never stored: a program cannot run
+    in zero time, so such a reading only means the timer was too coarse.
+    """
+
+    def __init__(self, path='suite_measurements.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._source_keys = {}
+        self.runs = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.runs = json.load(f)
+
+    def program_key(self, c_file):
+        if c_file not in self._source_keys:
+            h = hashlib.sha256()
+            manifest = os.path.splitext(c_file)[0] + MANIFEST_SUFFIX
+            for path in (c_file, manifest):
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        h.update(f.read())
+            self._source_keys[c_file] = h.hexdigest()[:16]
+        return self._source_keys[c_file]
+
+    def key(self, c_file, code, toolchain=None):
+        return f"{self.program_key(c_file)}:{toolchain or toolchain_id(CC)}:{code}"
+
+    def get(self, c_file, code, toolchain=None):
+        with self._lock:
+            return list(self.runs.get(self.key(c_file, code, toolchain), []))
+
+    def add(self, c_file, code, runtime):
+        if not runtime > 0:
+            return
+        with self._lock:
+            self.runs.setdefault(self.key(c_file, code), []).append(runtime)
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.runs, f)
+            os.replace(tmp_path, self.path)
+
+
+def measure(store, c_file, code, repeats, workdir):
+    """Tops up the stored runs for (c_file, code) to `repeats` and returns their median."""
+    runs = [r for r in store.get(c_file, code) if r > 0]
+    for i in range(len(runs), repeats):
+        exe = os.path.join(workdir, f"{store.program_key(c_file)}_{code}_{i}")
+        runtime = compile_and_run(c_file, decode_flag_code(code) + ["-lm"], output_bin=exe)
+        if os.path.exists(exe):
+            os.remove(exe)
+        store.add(c_file, code, runtime)
+        runs.append(runtime)
+    return statistics.median(runs)
+
+
+def geomean_speedup(baseline, timings):
+    """Geometric-mean speedup over the baseline; a failing program scores 0."""
+    logs = []
+    for program, t in timings.items():
+        if t == float('inf') or t <= 0:
+            return 0.0
+        logs.append(math.log(baseline[program] / t))
+    return math.exp(sum(logs) / len(logs)) if logs else 0.0
+
+
+def separation(baseline, results, program, candidates):
+    """Spread of log speedups a program shows across the surviving candidates."""
+    logs = [math.log(baseline[program] / results[c][program]) for c in candidates
+            if 0 < results[c][program] < float('inf')]
+    return statistics.pstdev(logs) if len(logs) > 1 else 0.0
+
+
+def tune_suite(directory, candidates=None, workers=None, rounds=4,
+               store_path='suite_measurements.json'):
+    """
+    Picks the one flag set that is fastest across every program in `directory`.
+
+    Candidates are scored by geometric-mean speedup over -O0 and narrowed by
+    successive halving. After each round the programs that best separate the
+    surviving candidates get an extra repetition, so measurement effort goes
+    where it can change the ranking rather than to programs every candidate
+    runs equally fast on. Runs execute in parallel (half the cores by default,
+    to limit interference between timings) and are cached in a
+    MeasurementStore, so repeated tuning only measures what is missing.
+
+    Returns a list of (flag code, speedup) pairs, best first.
+    """
+    programs = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".c"))
+    if not programs:
+        raise ValueError(f"No .c files found in {directory}")
+    surviving = list(candidates or all_flag_codes())
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    store = MeasurementStore(store_path)
+    repeats = {p: 1 for p in programs}
+    workdir = tempfile.mkdtemp()
+
+    def run_all(codes):
+        jobs = [(p, c) for c in codes for p in programs]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            times = list(pool.map(lambda job: measure(store, job[0], job[1], repeats[job[0]], workdir), jobs))
+        store.save()
+        results = {c: {} for c in codes}
+        for (p, c), t in zip(jobs, times):
+            results[c][p] = t
+        return results
+
+    try:
+        baseline = run_all([BASELINE_CODE])[BASELINE_CODE]
+        broken = [p for p in programs if not 0 < baseline[p] < float('inf')]
+        for p in broken:
+            print(f"[!] Dropping {p}: -O0 build or run failed")
+        programs = [p for p in programs if p not in broken]
+        if not programs:
+            raise RuntimeError(f"No program in {directory} could be benchmarked at -O0")
+
+        for round_no in range(1, rounds + 1):
+            # The baseline is re-measured too, so focused programs get extra -O0 runs
+            results = run_all([BASELINE_CODE] + [c for c in surviving if c != BASELINE_CODE])
+            baseline = results[BASELINE_CODE]
+            scores = {c: geomean_speedup(baseline, results[c]) for c in surviving}
+            surviving.sort(key=scores.get, reverse=True)
+            print(f"\n[Round {round_no}] {len(surviving)} candidates over {len(programs)} programs")
+            for code in surviving[:5]:
+                print(f"  {' '.join(decode_flag_code(code))}: {scores[code]:.3f}x")
+            if len(surviving) <= 2 or round_no == rounds:
+                break
+
+            spread = {p: separation(baseline, results, p, surviving) for p in programs}
+            focus = sorted(programs, key=spread.get, reverse=True)[:max(1, len(programs) // 4)]
+            for p in focus:
+                if spread[p] > 0:
+                    repeats[p] += 1
+            surviving = surviving[:max(2, len(surviving) // 2)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return [(code, scores[code]) for code in surviving]
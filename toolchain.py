@@ -0,0 +1,74 @@
+import hashlib
+import os
+import shutil
+import subprocess
+
+# Compiler used for every benchmark build; IR features always come from clang
+CC = os.environ.get("OPTIML_CC", "clang")
+
+# Per-row bookkeeping columns written next to the features; never model inputs
+METADATA_COLUMNS = ["source", "toolchain", "margin"]
+
+_fingerprints = {}
+
+
+def _first_line(cmd):
+    try:
+        out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, text=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return ""
+    lines = out.strip().splitlines()
+    return lines[0].strip() if lines else ""
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def toolchain_fingerprint(compiler=None):
+    """
+    Identifies the exact compiler that produced a measurement.
+
+    Returns a dict with the resolved binary path, its `--version` banner,
+    the `-dumpmachine` target triple, a hash of the binary itself and a short
+    `id` combining all four. Two builds with the same `id` came from the same
+    toolchain; anything else means the measurement may be stale.
+    """
+    compiler = compiler or CC
+    if compiler in _fingerprints:
+        return _fingerprints[compiler]
+    resolved = shutil.which(compiler)
+    if resolved is None:
+        raise FileNotFoundError(f"Compiler {compiler} not found on PATH")
+    path = os.path.realpath(resolved)
+    fingerprint = {
+        "path": path,
+        "version": _first_line([path, "--version"]),
+        "target": _first_line([path, "-dumpmachine"]),
+        "hash": _file_digest(path)[:16],
+    }
+    combined = "|".join(fingerprint[k] for k in ("path", "version", "target", "hash"))
+    fingerprint["id"] = hashlib.sha256(combined.encode()).hexdigest()[:12]
+    _fingerprints[compiler] = fingerprint
+    return fingerprint
+
+
+def toolchain_id(compiler=None):
+    return toolchain_fingerprint(compiler)["id"]
+
+
+def runner_up_margin(timings):
+    """
+    Relative gap between the best and second-best finite timing.
+
+    A margin of 0.02 means the winning label was only 2% faster than the
+    runner-up, so it is the first to flip when the compiler changes.
+    """
+    finite = sorted(t for t in timings.values() if t != float('inf'))
+    if len(finite) < 2 or finite[0] <= 0:
+        return float('inf')
+    return finite[1] / finite[0] - 1
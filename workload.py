@@ -0,0 +1,159 @@
+import json
+import math
+import mmap
+import os
+import subprocess
+import threading
+import time
+
+# Data size every projected cost is reported at, unless a manifest overrides it
+PRODUCTION_SIZE = int(os.environ.get("OPTIML_PRODUCTION_SIZE", "1000000"))
+MANIFEST_SUFFIX = ".workload.json"
+
+
+class WorkloadManifest:
+    """
+    Describes how a benchmark program should be fed at several input sizes.
+
+    A manifest lives next to the program as `<name>.workload.json`:
+
+        {
+          "production_size": 5000000,
+          "repeats": 1,
+          "sizes": [
+            {"size": 1000,   "argv": ["1000"],   "stdin": "inputs/small.txt"},
+            {"size": 100000, "argv": ["100000"], "stdin": "inputs/large.txt"}
+          ]
+        }
+
+    `argv` and `stdin` paths are resolved relative to the manifest. Any extra
+    input files the program opens itself can be listed under "files" so they
+    are checked up front instead of failing mid-benchmark.
+    """
+
+    def __init__(self, path, sizes, production_size=None, repeats=1):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.sizes = sorted(sizes, key=lambda s: s["size"])
+        self.production_size = production_size or PRODUCTION_SIZE
+        self.repeats = max(1, int(repeats))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        sizes = data.get("sizes", [])
+        if not sizes:
+            raise ValueError(f"Workload manifest {path} lists no sizes")
+        manifest = cls(path, sizes, data.get("production_size"), data.get("repeats", 1))
+        for entry in manifest.sizes:
+            for name in entry.get("files", []) + ([entry["stdin"]] if entry.get("stdin") else []):
+                if not os.path.exists(manifest.resolve(name)):
+                    raise FileNotFoundError(f"Workload input {name} missing for {path}")
+        return manifest
+
+    @classmethod
+    def for_source(cls, c_file):
+        """Returns the manifest next to `c_file`, or None if it has none."""
+        path = os.path.splitext(c_file)[0] + MANIFEST_SUFFIX
+        if not os.path.exists(path):
+            return None
+        return cls.load(path)
+
+    def resolve(self, name):
+        return name if os.path.isabs(name) else os.path.join(self.base_dir, name)
+
+
+class WorkloadRunner:
+    """
+    Runs a compiled binary across every size of a manifest and projects its
+    cost at the production size from a fitted runtime-vs-size curve.
+
+    Stdin inputs are memory-mapped once and the same pages are piped into
+    every run, so repeated candidates never re-read or regenerate them.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._inputs = {}
+        # Runners are shared by benchmark threads; map each input only once
+        self._lock = threading.Lock()
+
+    def _stdin_bytes(self, path):
+        with self._lock:
+            if path not in self._inputs:
+                with open(path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        self._inputs[path] = b""
+                    else:
+                        self._inputs[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._inputs[path]
+
+    def close(self):
+        with self._lock:
+            for data in self._inputs.values():
+                if isinstance(data, mmap.mmap):
+                    data.close()
+            self._inputs.clear()
+
+    def run_once(self, exe, manifest, entry):
+        argv = [os.path.abspath(exe)] + [str(a) for a in entry.get("argv", [])]
+        stdin_path = entry.get("stdin")
+        data = self._stdin_bytes(manifest.resolve(stdin_path)) if stdin_path else None
+        feed = {"input": data} if data is not None else {"stdin": subprocess.DEVNULL}
+        start = time.perf_counter()
+        try:
+            subprocess.run(
+                argv, check=True, cwd=manifest.base_dir,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=self.timeout, **feed
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            return float('inf')
+        return time.perf_counter() - start
+
+    def measure(self, exe, manifest):
+        """Returns a list of (size, best runtime) pairs for every manifest size."""
+        points = []
+        for entry in manifest.sizes:
+            runtime = min(self.run_once(exe, manifest, entry) for _ in range(manifest.repeats))
+            points.append((entry["size"], runtime))
+        return points
+
+    def projected_cost(self, exe, manifest):
+        points = self.measure(exe, manifest)
+        return project_runtime(points, manifest.production_size)
+
+
+def fit_scaling_curve(points):
+    """
+    Fits runtime = a * size^b by least squares in log-log space.
+
+    Returns (a, b). A single point is treated as linear scaling.
+    """
+    pts = [(s, t) for s, t in points if s > 0 and 0 < t < float('inf')]
+    if not pts:
+        return None
+    if len(pts) == 1:
+        size, runtime = pts[0]
+        return runtime / size, 1.0
+    xs = [math.log(s) for s, _ in pts]
+    ys = [math.log(t) for _, t in pts]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return math.exp(mean_y) / math.exp(mean_x), 1.0
+    b = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+    a = math.exp(mean_y - b * mean_x)
+    return a, b
+
+
+def project_runtime(points, production_size):
+    if any(t == float('inf') for _, t in points):
+        return float('inf')
+    curve = fit_scaling_curve(points)
+    if curve is None:
+        return float('inf')
+    a, b = curve
+    return a * production_size ** b